@@ -1,132 +1,345 @@
-from flask import Flask, request, jsonify, render_template_string, send_from_directory
-from prometheus_client import Counter, Histogram, generate_latest, REGISTRY
-from pythonjsonlogger import jsonlogger
+from flask import Flask, Response, request, jsonify, render_template_string
+from flask.json.provider import JSONProvider
+from werkzeug.middleware.shared_data import SharedDataMiddleware
+from prometheus_client import Histogram, generate_latest, REGISTRY, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily
+import orjson
 import logging
 import json
 import os
-from datetime import datetime
 import time
+import threading
+import itertools
 
-app = Flask(__name__)
+try:
+    from ft_utils.concurrent import AtomicInt64, ConcurrentDict
+except ImportError:
+    # ft_utils n'existe que pour Python >= 3.13 : repli sur un compteur protégé par un verrou
+    # et sur un dict classique (thread-safe sous le GIL)
+    class ConcurrentDict(dict):
+        def __init__(self, scaling=None):
+            super().__init__()
+
+    class AtomicInt64:
+        def __init__(self, value=0):
+            self._value = value
+            self._lock = threading.Lock()
+
+        def incr(self):
+            with self._lock:
+                self._value += 1
+                return self._value
+
+        def get(self):
+            return self._value
+
+
+def _orjson_default(obj):
+    """Les compteurs atomiques sont sérialisés par leur valeur courante"""
+    if isinstance(obj, AtomicInt64):
+        return obj.get()
+    raise TypeError
+
+
+class OrjsonProvider(JSONProvider):
+    """Sérialisation JSON de Flask (jsonify, get_json) via orjson"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+app = Flask(__name__, static_folder=None)
+app.json = OrjsonProvider(app)
 
 # ===== LOGGING STRUCTURÉ =====
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class OrjsonFormatter(logging.Formatter):
+    """Formatter JSON basé sur orjson (plus rapide que json.dumps de la stdlib)"""
+
+    def format(self, record):
+        entry = {"ts": record.created, "level": record.levelname, "msg": record.getMessage()}
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
 logger = logging.getLogger(__name__)
 handler = logging.StreamHandler()
-formatter = jsonlogger.JsonFormatter()
+formatter = OrjsonFormatter()
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
+# Logs par requête désactivés par défaut (DETAILED_LOGGING=1 pour déboguer)
+DETAILED_LOGGING = os.environ.get("DETAILED_LOGGING", "0") == "1"
+# Échantillonnage : 1 requête sur LOG_SAMPLE_RATE est journalisée
+# Les scrapes/probes (FAST_PATHS) ne sont ni journalisés ni comptés dans les métriques
+LOG_SAMPLE_RATE = max(1, int(os.environ.get("LOG_SAMPLE_RATE", "1")))
+FAST_PATHS = frozenset(("/health", "/metrics"))
+_req_counter = itertools.count()
+
 # ===== MÉTRIQUES PROMETHEUS =====
-request_count = Counter('api_requests_total', 'Total API requests', ['method', 'endpoint'])
-request_duration = Histogram('api_request_duration_seconds', 'API request duration', ['endpoint'])
-hit_counter = Counter('page_hits_total', 'Total hits per page', ['page_name'])
+# Histogramme de latence : 6 buckets (au lieu de 15 par défaut), désactivable pour le débit maximal
+ENABLE_LATENCY_HIST = os.environ.get("ENABLE_LATENCY_HIST", "1") == "1"
+request_duration = Histogram('api_request_duration_seconds', 'API request duration', ['endpoint'],
+                             buckets=(0.005, 0.025, 0.1, 0.5, 2.5, float('inf')),
+                             registry=REGISTRY if ENABLE_LATENCY_HIST else None)
+
+# Enfants de métriques pré-résolus : évite labels() (hash + tuple) à chaque requête
+# (labels = request.endpoint de Flask ; "not_found" pour les URLs sans route ou méthode refusée)
+# Remplis à partir de app.url_map une fois les routes déclarées (voir fin du module)
+REQ_DUR = {}
+
+
+# Chaque thread reçoit un numéro de cellule (round-robin) à son premier incrément.
+# threading.get_ident() ne convient pas : les adresses pthread sont alignées, donc ident % n == 0.
+_thread_cell = threading.local()
+_next_cell = itertools.count()
+
+
+class StripedCounter:
+    """Compteur réparti sur une cellule par CPU (style LongAdder) : les threads ne se disputent pas un verrou"""
+
+    def __init__(self, n_cells=None):
+        self.cells = [AtomicInt64(0) for _ in range(n_cells or os.cpu_count() or 1)]
+
+    def inc(self):
+        try:
+            index = _thread_cell.index
+        except AttributeError:
+            index = _thread_cell.index = next(_next_cell)
+        self.cells[index % len(self.cells)].incr()
+
+    def sum(self):
+        return sum(cell.get() for cell in self.cells)
+
+
+class RequestCountCollector:
+    """Expose api_requests_total en sommant les cellules au moment du scrape"""
+
+    def collect(self):
+        family = CounterMetricFamily('api_requests_total', 'Total API requests', labels=['method', 'endpoint'])
+        for (method, endpoint), counter in list(REQ_COUNT.items()):
+            family.add_metric([method, endpoint], counter.sum())
+        yield family
+
+
+REQ_COUNT = {}
+REGISTRY.register(RequestCountCollector())
 
 # ===== DONNÉES EN MÉMOIRE =====
-pages_data = {
-    1: {"id": 1, "name": "Home page", "hits": 4850, "created_at": datetime.now().isoformat()},
-    2: {"id": 2, "name": "Login / Sign up", "hits": 1320, "created_at": datetime.now().isoformat()},
-    3: {"id": 3, "name": "Shop / Products listing", "hits": 2940, "created_at": datetime.now().isoformat()},
-    4: {"id": 4, "name": "Product details page", "hits": 6780, "created_at": datetime.now().isoformat()},
-    5: {"id": 5, "name": "Search results page", "hits": 1150, "created_at": datetime.now().isoformat()},
-    6: {"id": 6, "name": "Cart page", "hits": 620, "created_at": datetime.now().isoformat()},
-    7: {"id": 7, "name": "Checkout page", "hits": 310, "created_at": datetime.now().isoformat()},
-    8: {"id": 8, "name": "Payment page", "hits": 245, "created_at": datetime.now().isoformat()},
-    9: {"id": 9, "name": "Order confirmation page", "hits": 230, "created_at": datetime.now().isoformat()},
-    10: {"id": 10, "name": "User profile / Account", "hits": 410, "created_at": datetime.now().isoformat()},
-    11: {"id": 11, "name": "Wishlist / Favorites", "hits": 180, "created_at": datetime.now().isoformat()},
-    12: {"id": 12, "name": "About us", "hits": 260, "created_at": datetime.now().isoformat()},
-    13: {"id": 13, "name": "Contact us", "hits": 140, "created_at": datetime.now().isoformat()},
-    14: {"id": 14, "name": "FAQ / Help", "hits": 195, "created_at": datetime.now().isoformat()},
-    15: {"id": 15, "name": "Admin dashboard", "hits": 85, "created_at": datetime.now().isoformat()}
+def _now_iso():
+    """Horodatage local ISO 8601 (équivalent à datetime.now().isoformat(), sans objet datetime)"""
+    seconds, nanos = divmod(time.time_ns(), 1_000_000_000)
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(seconds)) + f".{nanos // 1000:06d}"
+
+
+pages_data = ConcurrentDict(scaling=os.cpu_count())
+_SEED_PAGES = {
+    1: {"id": 1, "name": "Home page", "hits": AtomicInt64(4850), "created_at": _now_iso()},
+    2: {"id": 2, "name": "Login / Sign up", "hits": AtomicInt64(1320), "created_at": _now_iso()},
+    3: {"id": 3, "name": "Shop / Products listing", "hits": AtomicInt64(2940), "created_at": _now_iso()},
+    4: {"id": 4, "name": "Product details page", "hits": AtomicInt64(6780), "created_at": _now_iso()},
+    5: {"id": 5, "name": "Search results page", "hits": AtomicInt64(1150), "created_at": _now_iso()},
+    6: {"id": 6, "name": "Cart page", "hits": AtomicInt64(620), "created_at": _now_iso()},
+    7: {"id": 7, "name": "Checkout page", "hits": AtomicInt64(310), "created_at": _now_iso()},
+    8: {"id": 8, "name": "Payment page", "hits": AtomicInt64(245), "created_at": _now_iso()},
+    9: {"id": 9, "name": "Order confirmation page", "hits": AtomicInt64(230), "created_at": _now_iso()},
+    10: {"id": 10, "name": "User profile / Account", "hits": AtomicInt64(410), "created_at": _now_iso()},
+    11: {"id": 11, "name": "Wishlist / Favorites", "hits": AtomicInt64(180), "created_at": _now_iso()},
+    12: {"id": 12, "name": "About us", "hits": AtomicInt64(260), "created_at": _now_iso()},
+    13: {"id": 13, "name": "Contact us", "hits": AtomicInt64(140), "created_at": _now_iso()},
+    14: {"id": 14, "name": "FAQ / Help", "hits": AtomicInt64(195), "created_at": _now_iso()},
+    15: {"id": 15, "name": "Admin dashboard", "hits": AtomicInt64(85), "created_at": _now_iso()}
 }
+for _page_id, _page in _SEED_PAGES.items():
+    pages_data[_page_id] = _page
+# Liste matérialisée des pages (ordre de création), sérialisée telle quelle par GET /api/pages
+_pages_list = list(_SEED_PAGES.values())
+# Identifiant des nouvelles pages : incrément atomique, pas de collision entre threads
+_next_id = AtomicInt64(len(_SEED_PAGES))
+
+
+class PageHitsCollector:
+    """Expose page_hits_total au scrape : aucun verrou Prometheus par hit"""
+
+    def collect(self):
+        totals = {}
+        for page in _pages_list:
+            totals[page['name']] = totals.get(page['name'], 0) + page['hits'].get()
+        family = CounterMetricFamily('page_hits_total', 'Total hits per page', labels=['page_name'])
+        for name, hits in totals.items():
+            family.add_metric([name], hits)
+        yield family
+
+
+REGISTRY.register(PageHitsCollector())
+
+# Cache de /metrics : au plus une sérialisation par intervalle, même si plusieurs scrapers
+_METRICS_TTL = float(os.environ.get("METRICS_CACHE_TTL", "1.0"))
+_metrics_cache = [float("-inf"), None]
+_metrics_lock = threading.Lock()
+
+
+def reset_metrics_cache():
+    """Force la régénération de /metrics au prochain scrape"""
+    with _metrics_lock:
+        _metrics_cache[0] = float("-inf")
 
 # ===== MIDDLEWARE POUR TRACER LES REQUÊTES =====
+class TimedWsgi:
+    """Middleware WSGI : une seule mesure (compteur + histogramme + log) par requête"""
+
+    def __init__(self, wsgi_app, counters, histograms):
+        self.wsgi_app = wsgi_app
+        self.counters = counters
+        self.histograms = histograms
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        # Scrapes Prometheus et probes Kubernetes : ni métriques ni logs
+        if path in FAST_PATHS:
+            return self.wsgi_app(environ, start_response)
+
+        # Décidé une fois par requête : si INFO est filtré, aucun dict extra={} n'est construit
+        should_log = (DETAILED_LOGGING and logger.isEnabledFor(logging.INFO)
+                      and next(_req_counter) % LOG_SAMPLE_RATE == 0)
+        environ["hitcounter.should_log"] = should_log
+        status = []
+
+        def _start_response(status_line, headers, exc_info=None):
+            status.append(status_line)
+            return start_response(status_line, headers, exc_info)
+
+        start = time.monotonic_ns()
+        try:
+            return self.wsgi_app(environ, _start_response)
+        finally:
+            duration_ns = time.monotonic_ns() - start
+            method = environ.get("REQUEST_METHOD", "GET")
+            # Renseigné par Flask (_expose_endpoint) ; absent pour 404/405
+            endpoint = environ.get("hitcounter.endpoint") or "not_found"
+            counter = self.counters.get((method, endpoint))
+            if counter is None:
+                counter = self.counters.setdefault((method, endpoint), StripedCounter())
+            counter.inc()
+            if self.histograms is not None:
+                histogram = self.histograms.get(endpoint)
+                if histogram is None:
+                    histogram = self.histograms.setdefault(endpoint, request_duration.labels(endpoint=endpoint))
+                histogram.observe(duration_ns * 1e-9)
+            if should_log:
+                logger.info(f"Request completed", extra={
+                    "method": method,
+                    "path": path,
+                    "status": int(status[0][:3]) if status else 500,
+                    "duration_ms": duration_ns // 10_000 / 100,
+                    "request_id": environ.get("HTTP_X_REQUEST_ID") or f"req-{time.time_ns()}"
+                })
+
+
 @app.before_request
-def before_request():
-    request.start_time = time.time()
-    request_id = request.headers.get('X-Request-ID', f"req-{datetime.now().timestamp()}")
-    request.request_id = request_id
-    logger.info(f"Incoming request", extra={
-        "method": request.method,
-        "path": request.path,
-        "request_id": request_id
-    })
-
-@app.after_request
-def after_request(response):
-    duration = time.time() - request.start_time
-    endpoint = request.path.split('/')[1] or 'root'
-    request_count.labels(method=request.method, endpoint=endpoint).inc()
-    request_duration.labels(endpoint=endpoint).observe(duration)
-    logger.info(f"Request completed", extra={
-        "status": response.status_code,
-        "duration_ms": round(duration * 1000, 2),
-        "request_id": request.request_id
-    })
-    return response
+def _expose_endpoint():
+    """Transmet la vue routée par Flask à TimedWsgi (label Prometheus sans second routage)"""
+    request.environ["hitcounter.endpoint"] = request.endpoint
+
+
+app.wsgi_app = TimedWsgi(app.wsgi_app, REQ_COUNT, REQ_DUR if ENABLE_LATENCY_HIST else None)
+# Fichiers statiques servis au niveau WSGI (wsgi.file_wrapper), sans routage ni hooks Flask
+# cache_timeout=0 : revalidation (ETag / 304) à chaque chargement, pas de CSS périmé après un déploiement
+app.wsgi_app = SharedDataMiddleware(app.wsgi_app, {
+    '/static': os.path.join(os.path.dirname(__file__), 'static')
+}, cache_timeout=0)
 
 # ===== ROUTES API =====
 
+# Le dashboard est statique : lu une seule fois au démarrage
+with open(os.path.join(os.path.dirname(__file__), 'static', 'dashboard.html'), 'rb') as f:
+    _DASHBOARD_HTML = f.read()
+
+# Réponse de /health construite une seule fois (probes Kubernetes très fréquentes)
+_HEALTH_RESP = Response(b'{"status":"healthy"}', status=200, mimetype="application/json")
+_HEALTH_RESP.headers["Cache-Control"] = "no-store"
+
 @app.route('/', methods=['GET'])
 def dashboard():
     """Serve the dashboard"""
-    dashboard_path = os.path.join(os.path.dirname(__file__), 'static', 'dashboard.html')
-    with open(dashboard_path, 'r', encoding='utf-8') as f:
-        return f.read()
-
-@app.route('/static/<path:filename>', methods=['GET'])
-def static_files(filename):
-    """Serve static files (CSS, JS)"""
-    static_dir = os.path.join(os.path.dirname(__file__), 'static')
-    return send_from_directory(static_dir, filename)
+    return _DASHBOARD_HTML, 200, {"Content-Type": "text/html; charset=utf-8"}
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "healthy"}), 200
+    return _HEALTH_RESP
 
 @app.route('/api/pages', methods=['GET'])
 def get_pages():
-    return jsonify(list(pages_data.values())), 200
+    return Response(orjson.dumps(_pages_list, default=_orjson_default), status=200, mimetype="application/json")
 
 @app.route('/api/pages', methods=['POST'])
 def create_page():
     data = request.get_json()
-    if not data or 'name' not in data:
+    if not isinstance(data, dict) or 'name' not in data:
         return jsonify({"error": "name required"}), 400
+    if not isinstance(data['name'], str):
+        return jsonify({"error": "name must be a string"}), 400
     
-    page_id = len(pages_data) + 1
-    pages_data[page_id] = {
+    page_id = _next_id.incr()
+    page = {
         "id": page_id,
         "name": data['name'],
-        "hits": 0,
-        "created_at": datetime.now().isoformat()
+        "hits": AtomicInt64(0),
+        "created_at": _now_iso()
     }
-    return jsonify(pages_data[page_id]), 201
+    pages_data[page_id] = page
+    _pages_list.append(page)
+    return jsonify(page), 201
 
 @app.route('/api/pages/<int:page_id>/hits', methods=['GET'])
 def get_hits(page_id):
     if page_id not in pages_data:
         return jsonify({"error": "page not found"}), 404
-    return jsonify({"hits": pages_data[page_id]['hits']}), 200
+    return jsonify({"hits": pages_data[page_id]['hits'].get()}), 200
 
 @app.route('/api/pages/<int:page_id>/hit', methods=['POST'])
 def increment_hit(page_id):
     if page_id not in pages_data:
         return jsonify({"error": "page not found"}), 404
     
-    pages_data[page_id]['hits'] += 1
-    hit_counter.labels(page_name=pages_data[page_id]['name']).inc()
-    logger.info(f"Hit recorded", extra={
-        "page_id": page_id,
-        "page_name": pages_data[page_id]['name'],
-        "total_hits": pages_data[page_id]['hits']
-    })
-    return jsonify(pages_data[page_id]), 200
+    page = pages_data[page_id]
+    total_hits = page['hits'].incr()
+    if request.environ.get("hitcounter.should_log"):
+        logger.info(f"Hit recorded", extra={
+            "page_id": page_id,
+            "page_name": page['name'],
+            "total_hits": total_hits
+        })
+    return jsonify(page), 200
 
 @app.route('/metrics', methods=['GET'])
 def metrics():
-    return generate_latest(REGISTRY), 200
+    now = time.monotonic()
+    if now - _metrics_cache[0] >= _METRICS_TTL:
+        with _metrics_lock:
+            if now - _metrics_cache[0] >= _METRICS_TTL:
+                _metrics_cache[1] = Response(generate_latest(REGISTRY), status=200, content_type=CONTENT_TYPE_LATEST)
+                _metrics_cache[0] = now
+    return _metrics_cache[1]
+
+# Pré-création des séries pour les seuls couples (méthode, vue) réellement routés
+for _rule in app.url_map.iter_rules():
+    if _rule.rule in FAST_PATHS:
+        continue
+    if ENABLE_LATENCY_HIST:
+        REQ_DUR.setdefault(_rule.endpoint, request_duration.labels(endpoint=_rule.endpoint))
+    for _method in _rule.methods - {"HEAD", "OPTIONS"}:
+        REQ_COUNT[(_method, _rule.endpoint)] = StripedCounter()
 
 # ===== ERROR HANDLING =====
 @app.errorhandler(404)
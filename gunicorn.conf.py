@@ -0,0 +1,10 @@
+# ===== CONFIGURATION GUNICORN (production) =====
+# Les pages sont stockées en mémoire : un seul processus par défaut pour garder un état
+# cohérent, la concurrence passe par les threads (worker gthread, keep-alive HTTP).
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "1"))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", str(2 * (os.cpu_count() or 1) + 1)))
+keepalive = 5
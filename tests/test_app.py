@@ -2,8 +2,12 @@ import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
+from app import main
 from app.main import app
 import json
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
 
 def test_health():
     with app.test_client() as client:
@@ -11,6 +15,14 @@ def test_health():
         assert response.status_code == 200
         assert response.json['status'] == 'healthy'
 
+def test_get_pages():
+    with app.test_client() as client:
+        response = client.get('/api/pages')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/json'
+        assert response.json[0]['name'] == 'Home page'
+        assert isinstance(response.json[0]['hits'], int)
+
 def test_create_page():
     with app.test_client() as client:
         response = client.post('/api/pages', 
@@ -20,6 +32,33 @@ def test_create_page():
         assert response.json['name'] == 'Homepage'
         assert response.json['hits'] == 0
 
+def test_create_page_rejects_non_string_name():
+    with app.test_client() as client:
+        for name in (123, ['a'], {'a': 1}, None):
+            response = client.post('/api/pages', json={'name': name})
+            assert response.status_code == 400
+        for body in (['name'], 'name'):
+            response = client.post('/api/pages', json=body)
+            assert response.status_code == 400
+        main.reset_metrics_cache()
+        assert client.get('/metrics').status_code == 200
+
+def test_create_page_deeply_nested_body():
+    with app.test_client() as client:
+        response = client.post('/api/pages',
+            data='[' * 200000 + ']' * 200000,
+            content_type='application/json')
+        assert response.status_code == 400
+
+def test_create_page_unique_ids():
+    def create(i):
+        with app.test_client() as client:
+            return client.post('/api/pages', json={'name': f'Page {i}'}).json['id']
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(create, range(32)))
+    assert len(set(ids)) == len(ids)
+
 def test_increment_hit():
     with app.test_client() as client:
         # Create page
@@ -39,9 +78,98 @@ def test_metrics_endpoint():
         assert response.status_code == 200
         assert b'api_requests_total' in response.data
 
+def test_request_count_only_routed_pairs():
+    assert ('GET', 'dashboard') in main.REQ_COUNT
+    assert ('POST', 'create_page') in main.REQ_COUNT
+    assert ('POST', 'dashboard') not in main.REQ_COUNT
+    assert ('GET', 'create_page') not in main.REQ_COUNT
+
+def test_page_hits_metric():
+    with app.test_client() as client:
+        client.post('/api/pages/1/hit')
+        hits = client.get('/api/pages/1/hits').json['hits']
+        main.reset_metrics_cache()
+        response = client.get('/metrics')
+        assert f'page_hits_total{{page_name="Home page"}} {float(hits)}'.encode() in response.data
+
+def test_metrics_cached_within_ttl(monkeypatch):
+    def hits_line(hits):
+        return f'page_hits_total{{page_name="Home page"}} {float(hits)}'.encode()
+
+    monkeypatch.setattr(main, '_METRICS_TTL', 3600.0)
+    with app.test_client() as client:
+        main.reset_metrics_cache()
+        client.get('/metrics')
+        hits = client.post('/api/pages/1/hit').json['hits']
+        cached = client.get('/metrics').data
+        assert hits_line(hits - 1) in cached
+        assert hits_line(hits) not in cached
+        # TTL écoulé
+        monkeypatch.setattr(main, '_METRICS_TTL', 0.0)
+        assert hits_line(hits) in client.get('/metrics').data
+
+def _request_count(method, endpoint):
+    counter = main.REQ_COUNT.get((method, endpoint))
+    return counter.sum() if counter else 0
+
+def test_request_count_labels_404_and_405():
+    cases = [
+        ('GET', '/api/pages/1/hit', 405),
+        ('POST', '/api/pages/abc/hits', 404),
+        ('PUT', '/api/pages', 405),
+    ]
+    with app.test_client() as client:
+        for method, path, status in cases:
+            before = _request_count(method, 'not_found')
+            routed = {key: counter.sum() for key, counter in main.REQ_COUNT.items() if key[1] != 'not_found'}
+            assert client.open(path, method=method).status_code == status
+            assert _request_count(method, 'not_found') == before + 1
+            assert {key: counter.sum() for key, counter in main.REQ_COUNT.items()
+                    if key in routed} == routed
+
+def test_request_count_labels_routed_endpoint():
+    with app.test_client() as client:
+        before = _request_count('POST', 'increment_hit')
+        client.post('/api/pages/1/hit')
+        assert _request_count('POST', 'increment_hit') == before + 1
+
+def test_striped_counter_spreads_threads():
+    counter = main.StripedCounter(n_cells=4)
+    threads = [threading.Thread(target=lambda: [counter.inc() for _ in range(10)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.sum() == 80
+    assert sum(1 for cell in counter.cells if cell.get()) > 1
+
+def test_static_files():
+    with app.test_client() as client:
+        response = client.get('/static/style.css')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/css'
+        assert response.cache_control.max_age == 0
+        etag = response.headers['ETag']
+        response.close()
+        revalidated = client.get('/static/style.css', headers={'If-None-Match': etag})
+        assert revalidated.status_code == 304
+        revalidated.close()
+
 if __name__ == '__main__':
     test_health()
+    test_get_pages()
     test_create_page()
+    test_create_page_rejects_non_string_name()
+    test_create_page_deeply_nested_body()
+    test_create_page_unique_ids()
     test_increment_hit()
     test_metrics_endpoint()
+    test_request_count_only_routed_pairs()
+    test_page_hits_metric()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_metrics_cached_within_ttl(monkeypatch)
+    test_request_count_labels_404_and_405()
+    test_request_count_labels_routed_endpoint()
+    test_striped_counter_spreads_threads()
+    test_static_files()
     print("✓ All tests passed!")
\ No newline at end of file